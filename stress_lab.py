@@ -1,17 +1,145 @@
 import asyncio
-import statistics
+import contextlib
+import copy
+import json
 import time
-from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Literal, Optional
+from typing import Dict, List, Literal, Optional, Sequence
 
 import aiohttp
 import numpy as np
-import plotly.graph_objects as go
-import plotly.io as pio
-from plotly.subplots import make_subplots
 from pydantic import HttpUrl
 
+try:
+    import uvloop
+except ImportError:  # Optional, faster event loop on Linux/macOS
+    uvloop = None
+
+
+def _run_async(coro):
+    """Run a coroutine to completion, on uvloop when it is installed"""
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
+
+
+def _new_client_session(limit: int, limit_per_host: int, force_close: bool = False):
+    """
+    Create a client session backed by a keep-alive connection pool
+
+    Args:
+        limit (int): Maximum number of open connections
+        limit_per_host (int): Maximum number of open connections to the same host,
+            0 for no limit
+        force_close (bool): Close every connection after one request instead of
+            keeping it alive
+
+    Returns:
+        aiohttp.ClientSession: Client session to send the requests with
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+        force_close=force_close,
+        keepalive_timeout=None if force_close else 30,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+@lru_cache(maxsize=None)
+def _make_figure_skeleton():
+    """
+    Build the subplot grid, layout and axis styling shared by every results figure.
+    Cached, so callers must deep-copy it before adding traces.
+
+    Returns:
+        go.Figure: Figure without any data traces or title text
+    """
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(
+        rows=4,
+        cols=1,
+        subplot_titles=(
+            "<b>Test Summary</b>",
+            "<b>Request Pattern</b>",
+            "<b>Avg Response Time</b>",
+            "<b># Responses per second</b>",
+        ),
+        vertical_spacing=0.1,
+        specs=[
+            [{"type": "table"}],
+            [{"type": "xy"}],
+            [{"type": "xy"}],
+            [{"type": "xy"}],
+        ],
+        row_heights=[0.3, 0.2, 0.25, 0.25],
+    )
+
+    # Update layout
+    fig.update_layout(
+        title={
+            "y": 0.98,
+            "x": 0.5,
+            "xanchor": "center",
+            "yanchor": "top",
+        },
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1,
+            groupclick="toggleitem",
+        ),
+        plot_bgcolor="white",
+        autosize=True,
+        height=1600,
+        hovermode="x unified",
+    )
+
+    # Update axes
+    for i in range(2, 5):
+        if i == 2:
+            y_axis_title = "Requests per second"
+        elif i == 3:
+            y_axis_title = "Avg Response Time"
+        elif i == 4:
+            y_axis_title = "Responses per second"
+
+        fig.update_xaxes(
+            title_text="Time (seconds)",
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(128, 128, 128, 0.2)",
+            zeroline=True,
+            zerolinewidth=1,
+            zerolinecolor="rgba(128, 128, 128, 0.2)",
+            row=i,
+            col=1,
+        )
+        fig.update_yaxes(
+            title_text=y_axis_title,
+            showgrid=True,
+            gridwidth=1,
+            gridcolor="rgba(128, 128, 128, 0.2)",
+            zeroline=True,
+            zerolinewidth=1,
+            zerolinecolor="rgba(128, 128, 128, 0.2)",
+            row=i,
+            col=1,
+        )
+
+    # Remove gridlines for table subplot
+    fig.update_xaxes(showgrid=False, showticklabels=False, row=1, col=1)
+    fig.update_yaxes(showgrid=False, showticklabels=False, row=1, col=1)
+
+    return fig
+
 
 class StressLab:
     def __init__(
@@ -24,6 +152,8 @@ class StressLab:
         num_times: int = 5,
         wait_time: float = 1,
         ttfb_only: bool = True,
+        ttfb_includes_handshake: bool = False,
+        max_inflight: Optional[int] = None,
     ):
         """
         Initialize StressLab with test parameters
@@ -35,8 +165,12 @@ class StressLab:
             json_data (Dict, optional): JSON data to send with POST request
             requests_per_second (int): Number of requests to make per second
             num_times (int): Total number of times the request should be made at the given rate
-            wait_time (float): Time to wait between requests
+            wait_time (float): Time to wait between batches
             ttfb_only (bool): Whether to only measure TTFB
+            ttfb_includes_handshake (bool): Open a fresh connection for every request
+                so that TTFB includes the TCP/TLS handshake (cold connection)
+            max_inflight (int, optional): Maximum number of requests in flight at once.
+                Unbounded by default. A cap can delay requests past their schedule
         """
         self.url = url
         self.method = method
@@ -46,76 +180,272 @@ class StressLab:
         self.num_times = num_times
         self.wait_time = wait_time
         self.ttfb_only = ttfb_only
+        self.ttfb_includes_handshake = ttfb_includes_handshake
+        self.max_inflight = max_inflight
         self.stats = None
+        self.summary = None
+
+        # Encode the request body and headers once instead of on every request
+        self._body_bytes = None
+        self._effective_headers = dict(headers or {})
+        if method == "POST" and json_data:
+            self._body_bytes = json.dumps(json_data).encode()
+            # Header names are case-insensitive, so respect e.g. "content-type" too
+            if not any(k.lower() == "content-type" for k in self._effective_headers):
+                self._effective_headers["Content-Type"] = "application/json"
+
+        # Long-lived client session, only set inside `async with StressLab(...)`
+        self._session = None
+        # Caps concurrent requests; recreated by every run on its own event loop
+        self._sem = self._create_inflight_limiter()
+
+    def _create_inflight_limiter(self):
+        """
+        Create the limiter that caps the number of requests in flight
+
+        Returns:
+            asyncio.Semaphore | contextlib.nullcontext: No-op unless max_inflight is set
+        """
+        if self.max_inflight is None:
+            return contextlib.nullcontext()
+        return asyncio.Semaphore(self.max_inflight)
+
+    def _create_session(self):
+        """
+        Create a client session sized for this test
+
+        Returns:
+            aiohttp.ClientSession: Client session to send the requests with
+        """
+        # Keep-alive pool so requests reuse TCP/TLS connections, unless the
+        # user explicitly wants every request to pay for the handshake
+        return _new_client_session(
+            limit=self.requests_per_second * self.num_times,
+            limit_per_host=self.max_inflight or 0,
+            force_close=self.ttfb_includes_handshake,
+        )
+
+    async def __aenter__(self):
+        """Open a client session that is reused by every run_test call"""
+        self._session = self._create_session()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close the client session opened by __aenter__"""
+        await self._session.close()
+        self._session = None
 
     async def make_request(
         self,
         session: aiohttp.ClientSession,
-        start_timestamp: Optional[float] = None,
+        start_timestamp: Optional[int] = None,
     ):
         """
         Make a single request to a given URL
 
         Args:
             session (aiohttp.ClientSession): Client session to use for the request
-            start_timestamp (float, optional): Start time of the test
+            start_timestamp (int, optional): Start time of the test, from time.perf_counter_ns()
+
+        Returns:
+            Tuple: TTFB, status, timestamp and response size (-1 if not read)
+        """
+        # Bind attributes to locals once, so the hot path only does fast local lookups
+        method = self.method
+        url = self.url
+        headers = self._effective_headers
+        body = self._body_bytes
+        ttfb_only = self.ttfb_only
+        perf_counter_ns = time.perf_counter_ns
+
+        async with self._sem:
+            # Start the clock once a slot is free, so queueing is not counted as TTFB
+            start = perf_counter_ns()
+            if method == "GET":
+                request = session.get(url, headers=headers)
+            elif method == "POST":
+                request = session.post(url, data=body, headers=headers)
+            else:
+                request = session.request(method, url, data=body, headers=headers)
+
+            async with request as response:
+                ttfb = (perf_counter_ns() - start) / 1e9
+                response_size = -1
+                if ttfb_only:
+                    # Skip the body. aiohttp closes the connection instead of pooling
+                    # it unless the whole body has already arrived
+                    await response.release()
+                else:
+                    # Count the body as it streams in rather than buffering all of it
+                    response_size = 0
+                    async for chunk in response.content.iter_any():
+                        response_size += len(chunk)
+
+                return (
+                    ttfb,
+                    response.status,
+                    (perf_counter_ns() - (start_timestamp or start)) / 1e9,
+                    response_size,
+                )
+
+    async def _send_requests(
+        self,
+        session: aiohttp.ClientSession,
+        start_timestamp: int,
+    ):
+        """
+        Send all requests of the test on a fixed schedule
+
+        Args:
+            session (aiohttp.ClientSession): Client session to use for the requests
+            start_timestamp (int): Start time of the test, from time.perf_counter_ns()
 
         Returns:
-            Dict: Statistics about the request
+            List: Result tuples of all requests, in the order they were sent
         """
-        start = time.time()
-        kwargs = {"headers": self.headers or {}}
-        if self.method == "POST" and self.json_data:
-            kwargs["json"] = self.json_data
-
-        async with session.request(self.method, self.url, **kwargs) as response:
-            ttfb = time.time() - start
-            content = None if self.ttfb_only else await response.read()
-            response.close()
-
-            return {
-                "ttfb": ttfb,
-                "status": response.status,
-                "timestamp": time.time() - (start_timestamp or start),
-                "response_size": len(content) if content else None,
-            }
-
-    async def run_test(self):
+        # Spread every batch evenly over one second and pace requests against
+        # absolute deadlines, so time spent in flight never delays the schedule
+        # (unless max_inflight is set and every slot is taken)
+        loop = asyncio.get_running_loop()
+        self._sem = self._create_inflight_limiter()
+        interval = 1.0 / self.requests_per_second
+        first_deadline = loop.time()
+        tasks = []
+        for batch in range(self.num_times):
+            next_deadline = first_deadline + batch * (1 + self.wait_time)
+            for _ in range(self.requests_per_second):
+                await asyncio.sleep(max(0, next_deadline - loop.time()))
+                tasks.append(
+                    asyncio.create_task(self.make_request(session, start_timestamp))
+                )
+                next_deadline += interval
+
+        return await asyncio.gather(*tasks)
+
+    async def run_test(self, session: Optional[aiohttp.ClientSession] = None):
         """
         Run load test and collect statistics
+
+        Args:
+            session (aiohttp.ClientSession, optional): Client session to reuse. Defaults
+                to the one opened by `async with`, or a new one for this test only
         """
-        stats = defaultdict(list)
-        responses_per_second = defaultdict(int)
-        start_timestamp = time.time()
-
-        connector = aiohttp.TCPConnector(force_close=True)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            for _ in range(self.num_times):
-                tasks = [
-                    self.make_request(session, start_timestamp)
-                    for _ in range(self.requests_per_second)
-                ]
-                results = await asyncio.gather(*tasks)
-
-                for result in results:
-                    stats["ttfb"].append(result["ttfb"])
-                    stats["status"].append(result["status"])
-                    stats["timestamp"].append(result["timestamp"])
-                    if result["response_size"] is not None:
-                        stats["response_size"].append(result["response_size"])
-
-                    second = int(result["timestamp"])
-                    responses_per_second[second] += 1
-
-                await asyncio.sleep(self.wait_time)
-
-        stats["total_duration"] = time.time() - start_timestamp
-        stats["responses_per_second"] = dict(responses_per_second)
+        # Nothing to send, so there are no results to collect or summarize
+        total_requests = self.num_times * self.requests_per_second
+        if total_requests == 0:
+            self.stats = None
+            self.summary = None
+            return
+
+        # Preallocated struct-of-arrays, one slot per request
+        self._ttfb = np.empty(total_requests, dtype=np.float64)
+        self._status = np.empty(total_requests, dtype=np.int16)
+        self._ts = np.empty(total_requests, dtype=np.float64)
+        self._size = np.empty(total_requests, dtype=np.int64)
+        # Monotonic, nanosecond clock so TTFB is not affected by wall-clock jumps
+        start_timestamp = time.perf_counter_ns()
+
+        session = session or self._session
+        if session is not None:
+            results = await self._send_requests(session, start_timestamp)
+        else:
+            async with self._create_session() as session:
+                results = await self._send_requests(session, start_timestamp)
+
+        # Unpack the result tuples column-wise and copy each column in one go
+        ttfb, status, timestamp, response_size = zip(*results)
+        self._ttfb[:] = ttfb
+        self._status[:] = status
+        self._ts[:] = timestamp
+        self._size[:] = response_size
+
+        stats = {
+            "ttfb": self._ttfb,
+            "status": self._status,
+            "timestamp": self._ts,
+        }
+        if not self.ttfb_only:
+            stats["response_size"] = self._size
+        stats["total_duration"] = (time.perf_counter_ns() - start_timestamp) / 1e9
+
+        # Histogram of responses per whole second, keeping only non-empty seconds
+        counts = np.bincount(self._ts.astype(np.int64))
+        seconds = np.nonzero(counts)[0]
+        stats["responses_per_second"] = (seconds, counts[seconds])
         self.stats = stats
+        self.summary = self._summarize()
+
+    def _summarize(self):
+        """
+        Compute summary statistics of the last test in a single NumPy pass
+
+        Returns:
+            Dict: Summary statistics of the test
+        """
+        # Sort once and read min, max and every percentile off the sorted array
+        ttfb = np.sort(self.stats["ttfb"])
+        total_requests = len(ttfb)
+        total_success = int((self.stats["status"] == 200).sum())
+        # Linear interpolation between closest ranks, as np.percentile does
+        ranks = np.array([0.5, 0.9, 0.95, 0.99]) * (total_requests - 1)
+        median, p90, p95, p99 = np.interp(ranks, np.arange(total_requests), ttfb)
+
+        return {
+            "total_requests": total_requests,
+            "total_success": total_success,
+            "total_failures": total_requests - total_success,
+            "success_rate": total_success / total_requests,
+            "rps": total_requests / self.stats["total_duration"],
+            "avg_ttfb": ttfb.mean(),
+            "max_ttfb": ttfb[-1],
+            "min_ttfb": ttfb[0],
+            "median_ttfb": median,
+            "p90_ttfb": p90,
+            "p95_ttfb": p95,
+            "p99_ttfb": p99,
+        }
 
     def run(self):
         """Synchronous wrapper for run_test"""
-        asyncio.run(self.run_test())
+        _run_async(self.run_test())
+
+    @classmethod
+    def run_many(cls, configs: List["StressLab"]):
+        """
+        Run several tests one after another on a single event loop, sharing one
+        keep-alive client session between them
+
+        Args:
+            configs (List[StressLab]): Tests to run, in order
+        """
+        _run_async(cls._run_many(configs))
+
+    @classmethod
+    async def _run_many(cls, configs: List["StressLab"]):
+        """
+        Run several tests one after another on a shared client session
+
+        Args:
+            configs (List[StressLab]): Tests to run, in order
+        """
+        if not configs:
+            return
+
+        shared_session = _new_client_session(
+            limit=max(c.requests_per_second * c.num_times for c in configs),
+            limit_per_host=(
+                max(c.max_inflight for c in configs)
+                if all(c.max_inflight for c in configs)
+                else 0
+            ),
+        )
+        async with shared_session:
+            for config in configs:
+                # Cold-connection tests must not reuse pooled connections
+                if config.ttfb_includes_handshake:
+                    await config.run_test()
+                else:
+                    await config.run_test(shared_session)
 
     def plot_results(self):
         """
@@ -129,24 +459,11 @@ class StressLab:
             print("No test results available. Run the test first.")
             return
 
-        fig = make_subplots(
-            rows=4,
-            cols=1,
-            subplot_titles=(
-                "<b>Test Summary</b>",
-                "<b>Request Pattern</b>",
-                "<b>Avg Response Time</b>",
-                "<b># Responses per second</b>",
-            ),
-            vertical_spacing=0.1,
-            specs=[
-                [{"type": "table"}],
-                [{"type": "xy"}],
-                [{"type": "xy"}],
-                [{"type": "xy"}],
-            ],
-            row_heights=[0.3, 0.2, 0.25, 0.25],
-        )
+        # plotly is slow to import, so only load it when plotting
+        import plotly.graph_objects as go
+
+        # Start from a copy of the cached layout, so only the data traces are built here
+        fig = copy.deepcopy(_make_figure_skeleton())
 
         # Plot 1: Test Summary
         table_headers = ["Metric", "Value"]
@@ -156,6 +473,7 @@ class StressLab:
                 "Total Requests",
                 "Total Success",
                 "Total Failures",
+                "Success Rate",
                 "Requests per Second",
                 "Avg TTFB",
                 "Max TTFB",
@@ -167,17 +485,18 @@ class StressLab:
             ],
             [
                 f"{self.stats['total_duration']:.2f}s",
-                str(len(self.stats["ttfb"])),
-                str(self.stats["status"].count(200)),
-                str(len(self.stats["ttfb"]) - self.stats["status"].count(200)),
-                f"{len(self.stats['ttfb']) / self.stats['total_duration']:.2f}",
-                f"{statistics.mean(self.stats['ttfb']):.3f}s",
-                f"{max(self.stats['ttfb']):.3f}s",
-                f"{min(self.stats['ttfb']):.3f}s",
-                f"{statistics.median(self.stats['ttfb']):.3f}s",
-                f"{np.percentile(self.stats['ttfb'], 90):.3f}s",
-                f"{np.percentile(self.stats['ttfb'], 95):.3f}s",
-                f"{np.percentile(self.stats['ttfb'], 99):.3f}s",
+                str(self.summary["total_requests"]),
+                str(self.summary["total_success"]),
+                str(self.summary["total_failures"]),
+                f"{self.summary['success_rate']:.1%}",
+                f"{self.summary['rps']:.2f}",
+                f"{self.summary['avg_ttfb']:.3f}s",
+                f"{self.summary['max_ttfb']:.3f}s",
+                f"{self.summary['min_ttfb']:.3f}s",
+                f"{self.summary['median_ttfb']:.3f}s",
+                f"{self.summary['p90_ttfb']:.3f}s",
+                f"{self.summary['p95_ttfb']:.3f}s",
+                f"{self.summary['p99_ttfb']:.3f}s",
             ],
         ]
 
@@ -232,14 +551,13 @@ class StressLab:
         )
 
         # Plot 3: Avg Response Time (TTFB)
-        ttfb_data = list(zip(self.stats["timestamp"], self.stats["ttfb"]))
-        ttfb_data.sort(key=lambda x: x[0])  # Sort by timestamp
-        timestamps_ttfb = [point[0] for point in ttfb_data]
-        ttfb_values = [point[1] for point in ttfb_data]
-        avg_ttfb = sum(ttfb_values) / len(ttfb_values)
+        order = np.argsort(self.stats["timestamp"])  # Sort by timestamp
+        timestamps_ttfb = self.stats["timestamp"][order]
+        ttfb_values = self.stats["ttfb"][order]
+        avg_ttfb = self.summary["avg_ttfb"]
 
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=timestamps_ttfb,
                 y=ttfb_values,
                 mode="lines+markers",
@@ -262,7 +580,7 @@ class StressLab:
         fig.add_trace(
             go.Scatter(
                 x=timestamps_ttfb,
-                y=[avg_ttfb] * len(timestamps_ttfb),
+                y=np.full(len(timestamps_ttfb), avg_ttfb),
                 mode="lines",
                 name=f"Avg Response Time ({avg_ttfb:.3f}s)",
                 line=dict(color="#e74c3c", dash="dash"),
@@ -274,16 +592,14 @@ class StressLab:
         )
 
         # Plot 4: Actual Responses
-        sorted_data = sorted(self.stats["responses_per_second"].items())
-        timestamps = [point[0] for point in sorted_data]
-        responses = [point[1] for point in sorted_data]
+        timestamps, responses = self.stats["responses_per_second"]
 
         # Calculate statistics
-        avg_rps = sum(responses) / len(responses)
+        avg_rps = responses.mean()
 
         # Add response line with markers
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=timestamps,
                 y=responses,
                 mode="lines+markers",
@@ -324,78 +640,27 @@ class StressLab:
         )
 
         # Add plot title
-        # Update layout
         title_text = "<b>Load Test Analysis</b>"
         title_text += f"<br><sub><b>{self.url}</b></sub>"
-
-        fig.update_layout(
-            title={
-                "text": title_text,
-                "y": 0.98,
-                "x": 0.5,
-                "xanchor": "center",
-                "yanchor": "top",
-            },
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1,
-                groupclick="toggleitem",
-            ),
-            plot_bgcolor="white",
-            autosize=True,
-            height=1600,
-            hovermode="x unified",
-        )
-
-        # Update axes
-        for i in range(2, 5):
-            if i == 2:
-                y_axis_title = "Requests per second"
-            elif i == 3:
-                y_axis_title = "Avg Response Time"
-            elif i == 4:
-                y_axis_title = "Responses per second"
-
-            fig.update_xaxes(
-                title_text="Time (seconds)",
-                showgrid=True,
-                gridwidth=1,
-                gridcolor="rgba(128, 128, 128, 0.2)",
-                zeroline=True,
-                zerolinewidth=1,
-                zerolinecolor="rgba(128, 128, 128, 0.2)",
-                row=i,
-                col=1,
-            )
-            fig.update_yaxes(
-                title_text=y_axis_title,
-                showgrid=True,
-                gridwidth=1,
-                gridcolor="rgba(128, 128, 128, 0.2)",
-                zeroline=True,
-                zerolinewidth=1,
-                zerolinecolor="rgba(128, 128, 128, 0.2)",
-                row=i,
-                col=1,
-            )
-
-        # Remove gridlines for table subplot
-        fig.update_xaxes(showgrid=False, showticklabels=False, row=1, col=1)
-        fig.update_yaxes(showgrid=False, showticklabels=False, row=1, col=1)
+        fig.update_layout(title_text=title_text)
 
         fig.show()
         return fig
 
-    def save_results(self, fig=None, output_dir: str = "results"):
+    def save_results(
+        self,
+        fig=None,
+        output_dir: str = "results",
+        formats: Sequence[str] = ("html",),
+    ):
         """
-        Save test results as PDF and PNG files
+        Save test results as HTML, PDF and/or PNG files
 
         Args:
+            fig (go.Figure): Figure returned by plot_results
             output_dir (str): Directory to save results in
+            formats (Sequence[str]): File formats to save - "html", "pdf" and/or "png".
+                PDF and PNG are rendered with Kaleido, which is much slower than HTML.
         """
         if not self.stats:
             print("No test results available. Run the test first.")
@@ -409,4 +674,9 @@ class StressLab:
         base_filename = f"load_test_{timestamp}"
 
         # Save figures
-        pio.write_image(fig, f"{output_dir}/{base_filename}.pdf", scale=2)
+        for fmt in formats:
+            path = f"{output_dir}/{base_filename}.{fmt}"
+            if fmt == "html":
+                fig.write_html(path, include_plotlyjs="cdn")
+            else:
+                fig.write_image(path, scale=2)